@@ -2,17 +2,20 @@ import os
 import time
 import requests
 from app.llm.router import llm_router, intent_router
+from app.llm.model_policy import complete_with_policy, ModelRequestError
 
 def query_openrouter_llm(
     user_task: str,
     retrieved_docs=None,
-    model: str = "deepseek/deepseek-r1",
+    model: str = None,
     max_tokens: int = 512,
     temperature: float = 0.2
 ) -> str:
     """
     Queries OpenRouter LLM for code generation or explanation.
     Automatically handles DeepSeek models that return 'reasoning' instead of 'content'.
+    The model comes from the per-intent model policy (with fallbacks and hedging)
+    unless `model` is given explicitly.
     """
 
     # System prompts
@@ -51,28 +54,24 @@ Do not include your reasoning process or chain-of-thought unless it's part of th
         prompt = user_task
 
     # API setup
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
+    if not os.getenv("OPENROUTER_API_KEY"):
         raise ValueError("❌ Please set OPENROUTER_API_KEY in your environment.")
 
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
 
     # API call
     try:
         time.sleep(2)
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        data = response.json()
+        data, model_used = complete_with_policy(
+            messages,
+            intent=intent,
+            models=[model] if model else None,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
 
         # Handle errors
         if "error" in data:
@@ -104,13 +103,17 @@ Do not include your reasoning process or chain-of-thought unless it's part of th
             if len(parts) > 1:
                 content = parts[-1].strip()
 
-        print(f"✅ LLM returned {len(content)} characters for intent '{intent}'.")
+        print(f"✅ {model_used} returned {len(content)} characters for intent '{intent}'.")
         print(f"🪶 Sample output:\n{content[:200]}...\n")
         return content
 
     except requests.exceptions.Timeout:
         return "⚠️ Timeout: The request took too long."
 
+    except ModelRequestError as e:
+        print("❌ All models failed:", e)
+        return f"⚠️ API error: {e}"
+
     except requests.exceptions.RequestException as e:
         print("❌ Network or API error:", e)
         return f"⚠️ Network or API error: {e}"
@@ -0,0 +1,280 @@
+# ============================================================
+# 🔀 Model Policy — fallback & hedged OpenRouter requests
+# ============================================================
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+
+from config.settings import (
+    MODEL_POLICY,
+    MODEL_TIMEOUTS,
+    MODEL_CONNECT_TIMEOUT,
+    HEDGE_ENABLED,
+    HEDGE_MAX_OUTSTANDING,
+    HEDGE_PERCENTILE,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+)
+from app.utils.profiler import profiled_thread
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Primary/fallback attempts and hedges use separate pools, so hedges still
+# running after they lost can never starve new primary calls. A blocking
+# requests call cannot be interrupted from another thread: a losing attempt is
+# abandoned and keeps its worker until its response or read timeout arrives.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_OUTSTANDING, thread_name_prefix="llm-hedge")
+# Hedges outstanding process-wide (running or abandoned but not yet finished)
+_hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_OUTSTANDING)
+_record_lock = threading.Lock()
+
+
+class ModelRequestError(Exception):
+    """Raised when every model in the policy failed for a request."""
+
+
+# ============================================================
+# 🔹 Per-model latency stats
+# ============================================================
+class ModelLatencyStats:
+    """
+    Rolling window of latencies and outcomes per model.
+    Feeds the hedge delay (latency percentile) and the fallback order (error rate).
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._latencies = {}
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float, ok: bool):
+        with self._lock:
+            outcomes = self._outcomes.setdefault(model, deque(maxlen=self.window))
+            outcomes.append(ok)
+            if ok:
+                self._latencies.setdefault(model, deque(maxlen=self.window)).append(latency)
+
+    def percentile(self, model: str, pct: float):
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        idx = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[idx]
+
+    def error_rate(self, model: str) -> float:
+        with self._lock:
+            outcomes = list(self._outcomes.get(model, ()))
+        if not outcomes:
+            return 0.0
+        return 1 - sum(outcomes) / len(outcomes)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = {model: len(outcomes) for model, outcomes in self._outcomes.items()}
+        return {
+            model: {
+                "calls": models[model],
+                "error_rate": round(self.error_rate(model), 3),
+                "p50_s": self.percentile(model, 50),
+                "p95_s": self.percentile(model, 95),
+            }
+            for model in sorted(models)
+        }
+
+
+model_stats = ModelLatencyStats()
+
+
+# ============================================================
+# 🔹 Policy helpers
+# ============================================================
+def models_for_intent(intent: str) -> list:
+    """
+    Ordered models for an intent. Models failing more than half of their recent
+    calls are moved behind healthy ones, keeping the configured order otherwise.
+    """
+    models = MODEL_POLICY.get(intent) or MODEL_POLICY.get("chat") or ["deepseek/deepseek-r1"]
+    healthy = [m for m in models if model_stats.error_rate(m) < 0.5]
+    unhealthy = [m for m in models if m not in healthy]
+    return healthy + unhealthy
+
+
+def hedge_delay(model: str) -> float:
+    delay = model_stats.percentile(model, HEDGE_PERCENTILE)
+    if delay is None:
+        delay = HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, delay)
+
+
+def _is_good_response(data: dict) -> bool:
+    if "error" in data or not data.get("choices"):
+        return False
+    message = data["choices"][0].get("message", {})
+    return bool((message.get("content") or "").strip() or (message.get("reasoning") or "").strip())
+
+
+# ============================================================
+# 🔹 Single attempt
+# ============================================================
+def _record_attempt(session: requests.Session, model: str, elapsed: float, ok: bool):
+    """
+    Record an attempt's outcome exactly once: when it finishes, or as a timeout
+    if complete_with_policy hit its deadline first. Attempts that lost to a
+    winning hedge still record their late outcome; it is real model behaviour.
+    """
+    with _record_lock:
+        if getattr(session, "recorded", False):
+            return
+        session.recorded = True
+    model_stats.record(model, elapsed, ok=ok)
+
+
+@profiled_thread
+def _call_model(model: str, messages: list, max_tokens: int, temperature: float,
+                timeout: tuple, session: requests.Session) -> dict:
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError("❌ Please set OPENROUTER_API_KEY in your environment.")
+
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+
+    start = time.perf_counter()
+    try:
+        response = session.post(OPENROUTER_URL, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+    except Exception:
+        _record_attempt(session, model, time.perf_counter() - start, ok=False)
+        raise
+    finally:
+        session.close()
+
+    ok = _is_good_response(data)
+    _record_attempt(session, model, time.perf_counter() - start, ok=ok)
+    if not ok:
+        error = data.get("error")
+        msg = error.get("message", "Unknown error") if isinstance(error, dict) else "no usable output"
+        raise ModelRequestError(f"{model}: {msg}")
+    return data
+
+
+# ============================================================
+# 🔹 Policy-driven completion
+# ============================================================
+def complete_with_policy(messages: list,
+                         intent: str = "chat",
+                         models: list = None,
+                         max_tokens: int = 512,
+                         temperature: float = 0.2,
+                         timeout: float = None,
+                         hedge: bool = None):
+    """
+    Send a chat completion following the model policy for `intent`.
+
+    Models are tried in order; a failure (timeout, HTTP/API error, empty output)
+    moves on to the next one. With hedging enabled, once the current model has
+    been running longer than its latency percentile the next model is fired in
+    parallel and the first good response wins. At most HEDGE_MAX_OUTSTANDING
+    hedges exist process-wide; when none is free we keep waiting instead.
+
+    `timeout` is an overall deadline for the whole call, fallbacks and hedges
+    included; each attempt uses a short connect timeout and a read timeout
+    capped by the time left. Losing attempts are abandoned, not aborted: they
+    finish in the background within that read timeout.
+
+    Returns (data, model). Raises requests.exceptions.Timeout if the deadline
+    passed or every attempt timed out, otherwise ModelRequestError when all
+    models failed.
+    """
+    models = list(models or models_for_intent(intent))
+    timeout = timeout or MODEL_TIMEOUTS.get(intent, 60)
+    hedge = HEDGE_ENABLED if hedge is None else hedge
+    deadline = time.monotonic() + timeout
+
+    sessions = {}
+    in_flight = {}
+    errors = []
+    next_idx = 0
+
+    def launch(as_hedge: bool = False):
+        nonlocal next_idx
+        model = models[next_idx]
+        next_idx += 1
+        session = requests.Session()
+        session.started_at = time.perf_counter()
+        attempt_timeout = (MODEL_CONNECT_TIMEOUT, max(1.0, deadline - time.monotonic()))
+        args = (model, messages, max_tokens, temperature, attempt_timeout, session)
+        # Submitted with the caller's context so a request profiler follows the call
+        run = contextvars.copy_context().run
+        if as_hedge:
+            future = _hedge_executor.submit(run, _call_model, *args)
+            # Runs on completion or cancellation, so the slot is always returned
+            future.add_done_callback(lambda _: _hedge_slots.release())
+        else:
+            future = _executor.submit(run, _call_model, *args)
+        sessions[future] = session
+        in_flight[future] = model
+        return model
+
+    try:
+        primary = launch()
+        while in_flight:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Count still-running attempts as timeouts now, so a model that
+                # always hangs shows up in the stats and is deprioritized
+                for future, model in in_flight.items():
+                    if not future.cancel():
+                        session = sessions[future]
+                        _record_attempt(session, model, time.perf_counter() - session.started_at, ok=False)
+                raise requests.exceptions.Timeout(f"Deadline of {timeout}s exceeded ({', '.join(in_flight.values())})")
+
+            can_hedge = hedge and next_idx < len(models)
+            wait_for = min(hedge_delay(primary), remaining) if can_hedge else remaining
+            done, _ = wait(list(in_flight), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Current attempt is slower than usual: hedge with the next model
+                if can_hedge and deadline - time.monotonic() > 0 and _hedge_slots.acquire(blocking=False):
+                    hedged = launch(as_hedge=True)
+                    print(f"⏱️ {primary} slower than p{HEDGE_PERCENTILE:g}; hedging with {hedged}.")
+                    primary = hedged
+                continue
+
+            for future in done:
+                model = in_flight.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    print(f"⚠️ Model {model} failed: {e}")
+                    errors.append(e)
+                    continue
+                return data, model
+
+            # Everything in flight failed: fall back to the next model
+            if not in_flight and next_idx < len(models) and deadline - time.monotonic() > 0:
+                primary = launch()
+    finally:
+        # Attempts still running are abandoned, not aborted: requests has no way
+        # to interrupt a blocking call, so the worker (and hedge slot) is freed
+        # when the response or the read timeout arrives. Queued ones are cancelled.
+        for future in in_flight:
+            future.cancel()
+
+    if errors and all(isinstance(e, requests.exceptions.Timeout) for e in errors):
+        raise requests.exceptions.Timeout(f"All models timed out: {', '.join(models)}")
+    raise ModelRequestError("; ".join(str(e) for e in errors) or "No models configured")
@@ -2,11 +2,13 @@
 # 🔧 Router LLM — Intent Classifier (via OpenRouter)
 # ============================================================
 import os
+import time
 import requests
+from app.llm.model_policy import complete_with_policy, ModelRequestError
 
 def llm_router(
     prompt: str,
-    model: str = "deepseek/deepseek-r1",
+    model: str = None,
     max_tokens: int = 256,
     temperature: float = 0.2
 ) -> str:
@@ -15,40 +17,34 @@ def llm_router(
     - generate
     - explain
     - chat
+    Models follow the "router" entry of the model policy unless `model` is given.
     """
 
     api_key = os.getenv("OPENROUTER_API_KEY")
     if not api_key:
         raise ValueError("❌ Please set your OpenRouter API key as 'OPENROUTER_API_KEY' environment variable.")
 
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
+    messages = [
+        {"role": "user", "content": prompt}
+    ]
 
     try:
-        import time
         time.sleep(2)  # wait 2 seconds between calls
-        response = requests.post(url, headers=headers, json=payload, timeout=20)
-        response.raise_for_status()
-        content = response.json()["choices"][0]["message"]["content"].strip().lower()
+        data, _ = complete_with_policy(
+            messages,
+            intent="router",
+            models=[model] if model else None,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        content = (data["choices"][0]["message"].get("content") or "").strip().lower()
         return content
     except requests.exceptions.Timeout:
         print("⚠️ Router Timeout: The request took too long.")
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ModelRequestError) as e:
         print("❌ Router Network/API error:", e)
     except (KeyError, IndexError):
-        print("⚠️ Router Unexpected response format:", response.text)
+        print("⚠️ Router Unexpected response format:", data)
 
     return "chat"  # fallback
 
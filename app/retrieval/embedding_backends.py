@@ -0,0 +1,207 @@
+# ============================================================
+# 🧮 Embedding Backends — torch / ONNX / int8 ONNX on CPU
+# ============================================================
+import os
+import json
+import shutil
+import platform
+from functools import lru_cache
+from sentence_transformers import SentenceTransformer
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import Chroma
+from chromadb.api.client import SharedSystemClient
+
+from config.settings import EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE, EMBEDDING_COMPAT_THRESHOLD
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Written next to chroma.sqlite3 so we know which backend produced the stored vectors
+BACKEND_MARKER_FILE = "embedding_backend.json"
+
+# Fixed sentences embedded by every backend to check vector compatibility
+PROBE_TEXTS = [
+    "Write a function that checks if two strings are anagrams.",
+    "def fibonacci(n):\n    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)",
+    "Explain how a Python generator differs from a list.",
+    "hello, how are you today?",
+]
+
+
+def default_int8_file() -> str:
+    """Pick the pre-quantized ONNX file shipped with the model for this CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+class SentenceTransformerBackendEmbeddings(Embeddings):
+    """
+    LangChain embeddings on top of SentenceTransformer with a selectable backend.
+    All backends keep the model's own pooling/normalization modules, so vectors
+    live in the same space as the original torch index.
+    """
+
+    def __init__(self, model_name: str, backend: str = "torch", batch_size: int = 64):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"❌ Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+
+        if backend == "torch":
+            self.model = SentenceTransformer(model_name, device="cpu")
+        else:
+            file_name = EMBEDDING_ONNX_FILE or ("onnx/model.onnx" if backend == "onnx" else default_int8_file())
+            self.model = SentenceTransformer(
+                model_name,
+                device="cpu",
+                backend="onnx",
+                model_kwargs={"file_name": file_name}
+            )
+
+    def embed_documents(self, texts):
+        texts = [t.replace("\n", " ") for t in texts]
+        vectors = self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@lru_cache(maxsize=None)
+def _load_embedding_function(model_name: str, backend: str) -> SentenceTransformerBackendEmbeddings:
+    print(f"🔹 Loading embedding model ({backend} backend)...")
+    return SentenceTransformerBackendEmbeddings(model_name, backend=backend)
+
+
+def get_embedding_function(model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                           backend: str = None) -> SentenceTransformerBackendEmbeddings:
+    """
+    Load (once per process) the embedding function for the configured backend.
+    """
+    return _load_embedding_function(model_name, backend or EMBEDDING_BACKEND)
+
+
+# ============================================================
+# 🔹 Index compatibility
+# ============================================================
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+    return dot / norm if norm else 0.0
+
+
+def _read_marker(persist_directory: str):
+    path = os.path.join(persist_directory, BACKEND_MARKER_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_marker(persist_directory: str, marker: dict):
+    with open(os.path.join(persist_directory, BACKEND_MARKER_FILE), "w", encoding="utf-8") as f:
+        json.dump(marker, f)
+
+
+def write_backend_marker(persist_directory: str, embedding_function: SentenceTransformerBackendEmbeddings):
+    """Record which backend produced the vectors stored in persist_directory."""
+    _save_marker(persist_directory, {
+        "model_name": embedding_function.model_name,
+        "backend": embedding_function.backend,
+        "compatible_backends": [],
+        "probe_vectors": embedding_function.embed_documents(PROBE_TEXTS),
+    })
+
+
+def is_index_compatible(marker: dict, embedding_function: SentenceTransformerBackendEmbeddings) -> bool:
+    """
+    Compare the probe vectors saved with the index against the current backend.
+    """
+    if marker["model_name"] != embedding_function.model_name:
+        return False
+
+    current = embedding_function.embed_documents(PROBE_TEXTS)
+    similarity = min(_cosine(a, b) for a, b in zip(marker["probe_vectors"], current))
+    print(f"🔎 Embedding compatibility with stored index: min cosine {similarity:.4f}")
+    return similarity >= EMBEDDING_COMPAT_THRESHOLD
+
+
+def _recover_interrupted_rebuild(persist_directory: str):
+    """
+    Finish or roll back a swap left half-done by a crash in rebuild_index.
+    Whichever complete index is found ends up at persist_directory.
+    """
+    backup_dir, rebuild_dir = f"{persist_directory}.old", f"{persist_directory}.rebuild"
+    if os.path.isdir(backup_dir):
+        if os.path.exists(os.path.join(persist_directory, "chroma.sqlite3")):
+            shutil.rmtree(backup_dir)
+        else:
+            print(f"♻️ Restoring {persist_directory} from an interrupted rebuild...")
+            shutil.rmtree(persist_directory, ignore_errors=True)
+            os.rename(backup_dir, persist_directory)
+    if os.path.isdir(rebuild_dir):
+        shutil.rmtree(rebuild_dir)
+
+
+def rebuild_index(persist_directory: str, embedding_function: SentenceTransformerBackendEmbeddings,
+                  batch_size: int = 256):
+    """
+    Re-embed every document stored in a Chroma index with the current backend.
+    Texts, metadata and ids are read back from the index itself, so chat
+    responses added at runtime are kept as well as the original corpus.
+
+    The new index is built in a sibling directory and only swapped in once it
+    is complete (marker included), so a crash never leaves a half-empty index.
+    """
+    print(f"♻️ Rebuilding Chroma index in {persist_directory} with the {embedding_function.backend} backend...")
+    backup_dir, rebuild_dir = f"{persist_directory}.old", f"{persist_directory}.rebuild"
+    _recover_interrupted_rebuild(persist_directory)
+
+    stored = Chroma(persist_directory=persist_directory).get(include=["documents", "metadatas"])
+
+    new_store = Chroma(persist_directory=rebuild_dir, embedding_function=embedding_function)
+    ids, texts, metadatas = stored["ids"], stored["documents"], stored["metadatas"]
+    for i in range(0, len(ids), batch_size):
+        new_store.add_texts(
+            texts=texts[i:i + batch_size],
+            metadatas=metadatas[i:i + batch_size],
+            ids=ids[i:i + batch_size]
+        )
+    write_backend_marker(rebuild_dir, embedding_function)
+    del new_store
+
+    # Chroma caches one client per path; drop them so nothing keeps using the old files
+    SharedSystemClient.clear_system_cache()
+    os.rename(persist_directory, backup_dir)
+    os.rename(rebuild_dir, persist_directory)
+    shutil.rmtree(backup_dir)
+    print(f"💾 Re-embedded {len(ids)} documents.")
+
+
+def ensure_index_compatible(persist_directory: str, embedding_function: SentenceTransformerBackendEmbeddings):
+    """
+    Make sure the index at persist_directory was embedded in the same vector
+    space as embedding_function, re-embedding it when it was not.
+    Indexes built before backends existed have no marker and were built by torch.
+    Call it once at startup (see prepare_chroma_indexes), not per request.
+    """
+    _recover_interrupted_rebuild(persist_directory)
+    if not os.path.exists(os.path.join(persist_directory, "chroma.sqlite3")):
+        return
+
+    marker = _read_marker(persist_directory)
+    if marker is None:
+        write_backend_marker(persist_directory, get_embedding_function(embedding_function.model_name, "torch"))
+        marker = _read_marker(persist_directory)
+
+    known_backends = [marker["backend"]] + marker.get("compatible_backends", [])
+    if marker["model_name"] == embedding_function.model_name and embedding_function.backend in known_backends:
+        return
+
+    if is_index_compatible(marker, embedding_function):
+        marker.setdefault("compatible_backends", []).append(embedding_function.backend)
+        _save_marker(persist_directory, marker)
+    else:
+        rebuild_index(persist_directory, embedding_function)
@@ -2,21 +2,20 @@
 # 🔹 Settings & Paths
 # ============================================================
 import os
-from config.constants import CHROMA_EMBEDDINGS_DIR
-from sentence_transformers import SentenceTransformer
+from config.constants import CHROMA_EMBEDDINGS_DIR, CHROMA_MEMORY_DIR
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain.docstore.document import Document
+from app.retrieval.embedding_backends import get_embedding_function, ensure_index_compatible, write_backend_marker
 
 os.makedirs(CHROMA_EMBEDDINGS_DIR, exist_ok=True)
 
 # ============================================================
 # 🔹 Load embedding model
 # ============================================================
-def load_embedding_model(model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+def load_embedding_model(model_name: str = "sentence-transformers/all-MiniLM-L6-v2", backend: str = None):
     print("🔹 Loading embedding model...")
-    embed_model = SentenceTransformer(model_name)
-    embedding_function = SentenceTransformerEmbeddings(model_name=model_name)
+    embedding_function = get_embedding_function(model_name, backend)
+    embed_model = embedding_function.model
     return embed_model, embedding_function
 
 # ============================================================
@@ -43,6 +42,7 @@ def corpus_to_documents(df_corpus):
 def get_chroma_vectorstore(documents, persist_directory=CHROMA_EMBEDDINGS_DIR, embedding_function=None):
     if os.path.exists(os.path.join(persist_directory, "chroma.sqlite3")):
         print("✅ Loading existing Chroma index from disk...")
+        ensure_index_compatible(persist_directory, embedding_function)
         vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embedding_function)
     else:
         print("⚙️ Building new Chroma index (this may take a while)...")
@@ -52,6 +52,7 @@ def get_chroma_vectorstore(documents, persist_directory=CHROMA_EMBEDDINGS_DIR, e
             persist_directory=persist_directory
         )
         vectorstore.persist()
+        write_backend_marker(persist_directory, embedding_function)
         print("💾 Embeddings saved to:", persist_directory)
     print("✅ Chroma vector store ready with", len(documents), "items.")
     return vectorstore
@@ -74,15 +75,17 @@ def demo_retrieval(vectorstore, query="Write a function that checks if two strin
         print(doc.metadata["canonical_solution"][:200])
 
 def reload_chroma_vectorstore(embed_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
-                              persist_directory: str = CHROMA_EMBEDDINGS_DIR):
+                              persist_directory: str = CHROMA_EMBEDDINGS_DIR,
+                              backend: str = None):
     """
     Reload an existing Chroma vector store and embedding model without recalculating embeddings.
+    The embedding model is loaded once per process and shared between calls.
+    Backend compatibility is checked once at startup by prepare_chroma_indexes.
     """
     print("🔹 Reloading embedding model and Chroma store...")
 
-    # Recreate embedding function
-    embed_model = SentenceTransformer(embed_model_name)
-    embedding_function = SentenceTransformerEmbeddings(model_name=embed_model_name)
+    # Reuse the cached embedding function for the configured backend
+    embedding_function = get_embedding_function(embed_model_name, backend)
 
     # Reload Chroma collection from disk
     chroma_collection = Chroma(
@@ -91,5 +94,15 @@ def reload_chroma_vectorstore(embed_model_name: str = "sentence-transformers/all
     )
 
     print("✅ Loaded Chroma collection from disk:", persist_directory)
-    print("✅ Embedding model ready:", embed_model_name)
+    print(f"✅ Embedding model ready: {embed_model_name} ({embedding_function.backend})")
     return chroma_collection
+
+def prepare_chroma_indexes(embed_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                           backend: str = None):
+    """
+    Check the corpus and memory indexes against the configured embedding backend,
+    re-embedding them if needed. Run once at startup, before serving requests.
+    """
+    embedding_function = get_embedding_function(embed_model_name, backend)
+    for persist_directory in (CHROMA_EMBEDDINGS_DIR, CHROMA_MEMORY_DIR):
+        ensure_index_compatible(persist_directory, embedding_function)
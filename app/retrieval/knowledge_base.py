@@ -1,9 +1,12 @@
 from datasets import load_dataset
 import itertools
+import hashlib
 import os
 import pandas as pd
 from collections import defaultdict
-from config.constants import COMBINED_RAG_CORPUS, GROUND_TRUTH_JSON
+from config.constants import COMBINED_RAG_CORPUS, GROUND_TRUTH_JSON, NEAR_DUPLICATES_JSON
+from config.settings import NEAR_DEDUP_ENABLED, NEAR_DEDUP_THRESHOLD, NEAR_DEDUP_NUM_PERM, NEAR_DEDUP_SHINGLE_SIZE
+from app.retrieval.near_dedup import NearDuplicateFilter
 import json
 
 # --- Load MBPP (train) + HumanEval (test) ---
@@ -22,7 +25,20 @@ except Exception as e:
 # --- Combine datasets ---
 rows = []
 
+# --- Near-duplicate filter (MinHash/LSH), applied as rows stream in ---
+near_dup_filter = NearDuplicateFilter(
+    threshold=NEAR_DEDUP_THRESHOLD,
+    num_perm=NEAR_DEDUP_NUM_PERM,
+    shingle_size=NEAR_DEDUP_SHINGLE_SIZE
+) if NEAR_DEDUP_ENABLED else None
+near_dup_solutions = {}  # removed id -> its canonical solution
+# Exact copies are dropped by hash before the MinHash filter, so they are not
+# reported as near-duplicates
+seen_full_hashes = set()
+n_exact_dups = 0
+
 def add_examples(ds, source, prompt_field, sol_field, start_idx=0, max_examples=None):
+    global n_exact_dups
     n_added = 0
     for i, ex in enumerate(ds):
         if max_examples and n_added >= max_examples:
@@ -31,12 +47,22 @@ def add_examples(ds, source, prompt_field, sol_field, start_idx=0, max_examples=
         sol = ex.get(sol_field, "")
         if not prompt.strip() or not sol.strip():
             continue
+        row_id = f"{source}_{start_idx + i}"
+        full = (prompt.strip() + "\n\n" + sol.strip())
+        full_hash = hashlib.sha1(full.encode("utf-8")).hexdigest()
+        if full_hash in seen_full_hashes:
+            n_exact_dups += 1
+            continue
+        seen_full_hashes.add(full_hash)
+        if near_dup_filter is not None and near_dup_filter.add(row_id, full) is not None:
+            near_dup_solutions[row_id] = sol.strip()
+            continue
         rows.append({
             "source": source,
-            "id": f"{source}_{start_idx + i}",
+            "id": row_id,
             "prompt": prompt.strip(),
             "canonical_solution": sol.strip(),
-            "full": (prompt.strip() + "\n\n" + sol.strip())
+            "full": full
         })
         n_added += 1
     return n_added
@@ -50,11 +76,26 @@ if codeparrot:
 # --- Create DataFrame ---
 df_corpus = pd.DataFrame(rows)
 
-# --- Deduplicate ---
+# --- Deduplicate (exact copies are already skipped by hash in add_examples) ---
 df_corpus = df_corpus.drop_duplicates(subset=["full"]).reset_index(drop=True)
 print(f"Combined corpus size (dedup): {len(df_corpus)}")
+print(f"Exact duplicates removed: {n_exact_dups}")
 print(f"MBPP added: {n_mbpp}, HumanEval added: {n_he}, CodeParrot added: {n_cp}")
 
+# --- Near-duplicate report ---
+if near_dup_filter is not None:
+    near_dup_report = near_dup_filter.report()
+    print(f"🧬 Near-duplicates removed: {near_dup_report['removed']} "
+          f"in {near_dup_report['clusters']} clusters (threshold {NEAR_DEDUP_THRESHOLD})")
+    print(f"🧬 Cluster sizes: {near_dup_report['cluster_size_histogram']}")
+    for cluster in near_dup_report["largest_clusters"]:
+        print(f"   {cluster['representative']}: {cluster['size']} copies")
+
+    os.makedirs(os.path.dirname(NEAR_DUPLICATES_JSON), exist_ok=True)
+    with open(NEAR_DUPLICATES_JSON, "w", encoding="utf-8") as f:
+        json.dump({"report": near_dup_report, "exact_duplicates": n_exact_dups,
+                   "clusters": near_dup_filter.clusters}, f, indent=2)
+
 # --- Ensure types ---
 df_corpus["prompt"] = df_corpus["prompt"].astype(str)
 df_corpus["canonical_solution"] = df_corpus["canonical_solution"].astype(str)
@@ -75,6 +116,17 @@ for idx, row in df_corpus.iterrows():
     solution = row['canonical_solution'].strip()
     ground_truth_ids_for_task[solution].append(row['id'])
 
+# Removed near-duplicates point at the representative that stayed in the index
+if near_dup_filter is not None:
+    kept_ids = set(df_corpus["id"])
+    for representative, removed_ids in near_dup_filter.clusters.items():
+        if representative not in kept_ids:
+            continue
+        for removed_id in removed_ids:
+            relevant = ground_truth_ids_for_task[near_dup_solutions[removed_id]]
+            if representative not in relevant:
+                relevant.append(representative)
+
 # Convert defaultdict to regular dict for saving
 ground_truth_ids_for_task = dict(ground_truth_ids_for_task)
 
@@ -1,3 +1,24 @@
+from langchain.docstore.document import Document
+
+
+def format_context(results) -> str:
+    """
+    Format (Document, score) pairs returned by Chroma into a context string.
+    """
+    context_pieces = []
+    for doc, score in results:
+        prompt_text = doc.page_content
+        sol_text = doc.metadata.get("canonical_solution", "")
+        source = doc.metadata.get("source", "unknown")
+        snippet = "\n".join(sol_text.split("\n")[:6])  # limit to 6 lines
+        context_pieces.append(
+            f"# From {source.upper()} dataset\n"
+            f"Example task:\n{prompt_text.strip()}\n\nExample solution:\n{snippet.strip()}\n"
+        )
+
+    return "\n\n".join(context_pieces).strip()
+
+
 def retrieve_context_from_chroma(query: str, chroma_collection, k: int = 8) -> str:
     """
     Retrieve relevant examples from Chroma and format them into a context string.
@@ -14,15 +35,44 @@ def retrieve_context_from_chroma(query: str, chroma_collection, k: int = 8) -> s
         print(f"⚠️ Retrieval failed: {e}")
         return ""
 
-    context_pieces = []
-    for doc, score in results:
-        prompt_text = doc.page_content
-        sol_text = doc.metadata.get("canonical_solution", "")
-        source = doc.metadata.get("source", "unknown")
-        snippet = "\n".join(sol_text.split("\n")[:6])  # limit to 6 lines
-        context_pieces.append(
-            f"# From {source.upper()} dataset\n"
-            f"Example task:\n{prompt_text.strip()}\n\nExample solution:\n{snippet.strip()}\n"
+    return format_context(results)
+
+
+def retrieve_contexts_batch(queries, chroma_collection, k: int = 8) -> list:
+    """
+    Retrieve contexts for many queries at once.
+    All queries are embedded in a single batched call and searched with a single
+    Chroma query, so both the embedding model and the index run once per batch.
+    Returns one context string per query (empty strings on failure).
+    """
+    if not queries:
+        return []
+
+    if isinstance(chroma_collection, tuple):
+        chroma_collection = chroma_collection[0]
+
+    try:
+        vectors = chroma_collection._embedding_function.embed_documents(list(queries))
+    except Exception as e:
+        print(f"⚠️ Batch embedding failed, falling back to per-query retrieval: {e}")
+        return [retrieve_context_from_chroma(q, chroma_collection, k=k) for q in queries]
+
+    try:
+        results = chroma_collection._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
         )
+    except Exception as e:
+        print(f"⚠️ Batch retrieval failed: {e}")
+        return [""] * len(queries)
 
-    return "\n\n".join(context_pieces).strip()
+    contexts = []
+    for documents, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"]):
+        pairs = [
+            (Document(page_content=text, metadata=metadata or {}), distance)
+            for text, metadata, distance in zip(documents, metadatas, distances)
+        ]
+        contexts.append(format_context(pairs))
+
+    return contexts
@@ -0,0 +1,212 @@
+# ============================================================
+# 🚦 Admission Control — bounded concurrency, short queue, rate limits
+# ============================================================
+import hmac
+import math
+import time
+import uuid
+import asyncio
+import hashlib
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away; carries the HTTP status and Retry-After."""
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+def issue_session_cookie(secret: str) -> str:
+    """New session id signed with the server secret: "<id>.<hmac>"."""
+    session_id = uuid.uuid4().hex
+    signature = hmac.new(secret.encode(), session_id.encode(), hashlib.sha256).hexdigest()
+    return f"{session_id}.{signature}"
+
+
+def verify_session_cookie(value: str, secret: str):
+    """Session id from a cookie issued by issue_session_cookie, or None if forged/malformed."""
+    session_id, _, signature = (value or "").partition(".")
+    if not session_id or not signature:
+        return None
+    expected = hmac.new(secret.encode(), session_id.encode(), hashlib.sha256).hexdigest()
+    return session_id if hmac.compare_digest(signature, expected) else None
+
+
+class SessionRateLimiter:
+    """
+    Token bucket per key (a session, or a client IP): `rate_per_min` sustained,
+    `burst` at once. `label` names the key in rejection messages.
+    """
+
+    def __init__(self, rate_per_min: float, burst: int, max_sessions: int = 10000, label: str = "session"):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.label = label
+        self.max_sessions = max_sessions
+        self._buckets = {}
+
+    def check(self, session_id: str, take: bool = True):
+        """
+        Take one token or raise AdmissionRejected (429).
+        With take=False only check that a token is available.
+        """
+        if self.rate <= 0:
+            return
+
+        now = time.monotonic()
+        tokens, last = self._buckets.get(session_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        if tokens < 1:
+            self._buckets[session_id] = (tokens, now)
+            raise AdmissionRejected(429, (1 - tokens) / self.rate, f"Rate limit exceeded for this {self.label}.")
+        if not take:
+            return
+
+        self._buckets[session_id] = (tokens - 1, now)
+        if len(self._buckets) > self.max_sessions:
+            self._evict(now)
+
+    def _evict(self, now: float):
+        # Sessions whose bucket has refilled completely carry no state worth keeping
+        full_after = self.burst / self.rate
+        self._buckets = {s: v for s, v in self._buckets.items() if now - v[1] < full_after}
+
+
+class AdmissionController:
+    """
+    Gate for expensive requests.
+
+    - At most `max_concurrent` requests run at once.
+    - At most `max_queue` more wait for a slot, each for up to `max_wait_s`.
+    - A request is rejected up front (503 + Retry-After) when the queue is full
+      or the estimated wait already exceeds its budget (the server's max wait,
+      or the client's own deadline minus the typical service time).
+    - Each session is rate limited separately (429 + Retry-After), and so is
+      each client IP, since new sessions are free to create. Tokens are only
+      taken once the request holds a slot, so requests turned away with 503
+      do not use up the budget.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait_s: float,
+                 rate_limiter: SessionRateLimiter = None, ip_rate_limiter: SessionRateLimiter = None,
+                 window: int = 200):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.rate_limiter = rate_limiter
+        self.ip_rate_limiter = ip_rate_limiter
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._in_flight = 0
+        self._waiting = 0
+        self._wait_times = deque(maxlen=window)
+        self._service_times = deque(maxlen=window)
+        self._counts = {"admitted": 0, "rejected_queue_full": 0, "rejected_deadline": 0,
+                        "rejected_timeout": 0, "rejected_rate_limit": 0}
+
+    def _avg_service_time(self) -> float:
+        return sum(self._service_times) / len(self._service_times) if self._service_times else 0.0
+
+    def estimated_wait(self) -> float:
+        """Expected queueing delay for a newly arriving request."""
+        if self._in_flight < self.max_concurrent:
+            return 0.0
+        return (self._waiting + 1) / self.max_concurrent * self._avg_service_time()
+
+    def _reject(self, kind: str, status_code: int, retry_after: float, reason: str):
+        self._counts[kind] += 1
+        print(f"🚦 Rejected request ({kind}): {reason}")
+        raise AdmissionRejected(status_code, retry_after, reason)
+
+    def _check_rate_limits(self, session_id: str, client_ip: str, take: bool):
+        limits = []
+        if self.rate_limiter is not None:
+            limits.append((self.rate_limiter, session_id))
+        if self.ip_rate_limiter is not None and client_ip is not None:
+            limits.append((self.ip_rate_limiter, client_ip))
+
+        try:
+            # Check every bucket before taking from any, so a 429 charges nothing
+            for limiter, key in limits:
+                limiter.check(key, take=False)
+            if take:
+                for limiter, key in limits:
+                    limiter.check(key)
+        except AdmissionRejected:
+            self._counts["rejected_rate_limit"] += 1
+            raise
+
+    @asynccontextmanager
+    async def admit(self, session_id: str, deadline_s: float = None, client_ip: str = None):
+        """
+        Hold a slot for the duration of the `async with` block.
+        `deadline_s` is how long the client is willing to wait in total.
+        """
+        # Fail fast when the session or IP is already out of tokens
+        self._check_rate_limits(session_id, client_ip, take=False)
+
+        wait_budget = self.max_wait_s
+        if deadline_s is not None:
+            wait_budget = min(wait_budget, deadline_s - self._avg_service_time())
+
+        if self._in_flight >= self.max_concurrent:
+            estimate = self.estimated_wait()
+            if self._waiting >= self.max_queue:
+                self._reject("rejected_queue_full", 503, estimate or self.max_wait_s, "Server is busy, queue is full.")
+            if estimate > wait_budget:
+                self._reject("rejected_deadline", 503, estimate, "Server is busy, expected wait exceeds the deadline.")
+
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            if self._semaphore.locked():
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(wait_budget, 0.0))
+            else:
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            self._reject("rejected_timeout", 503, self.estimated_wait() or self.max_wait_s,
+                         "Server is busy, timed out waiting for a slot.")
+        finally:
+            self._waiting -= 1
+
+        self._wait_times.append(time.perf_counter() - start)
+        try:
+            self._check_rate_limits(session_id, client_ip, take=True)
+        except AdmissionRejected:
+            # Another request of this session/IP took the last token while we queued
+            self._semaphore.release()
+            raise
+
+        self._counts["admitted"] += 1
+        self._in_flight += 1
+        service_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._service_times.append(time.perf_counter() - service_start)
+            self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))], 3) if waits else None
+
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "wait_p50_s": pct(50),
+            "wait_p95_s": pct(95),
+            "avg_service_s": round(self._avg_service_time(), 3),
+            "estimated_wait_s": round(self.estimated_wait(), 3),
+            **self._counts,
+        }
@@ -0,0 +1,238 @@
+# ============================================================
+# 📦 Batch Runner — push many tasks through the LangGraph agent
+# ============================================================
+import os
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from app.utils.langgraph_setup import invoke_agent, chroma_collection
+from app.retrieval.retriever import retrieve_contexts_batch
+
+
+# ============================================================
+# 🔹 Load tasks from JSONL / CSV
+# ============================================================
+def load_batch_tasks(input_path: str) -> list:
+    """
+    Read tasks from a .jsonl or .csv file.
+    Each record needs a 'user_task' (or 'prompt') field and may carry an 'id'.
+    Records without an id get their line number as id.
+    """
+    tasks = []
+    if input_path.endswith(".csv"):
+        with open(input_path, "r", encoding="utf-8", newline="") as f:
+            records = list(csv.DictReader(f))
+    else:
+        with open(input_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    for idx, record in enumerate(records):
+        user_task = (record.get("user_task") or record.get("prompt") or "").strip()
+        if not user_task:
+            continue
+        tasks.append({"id": str(record.get("id") or idx), "user_task": user_task})
+
+    return tasks
+
+
+def load_completed_ids(output_path: str) -> set:
+    """
+    Collect ids that already succeeded in the output file so a rerun can resume.
+    Failed records are not counted, so they are retried (and their new result
+    appended). A partially written trailing line (e.g. after a crash) is
+    ignored here and removed by truncate_partial_line before appending.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if not record.get("error"):
+                    completed.add(str(record["id"]))
+            except (ValueError, KeyError):
+                continue
+    return completed
+
+
+def truncate_partial_line(output_path: str):
+    """
+    Drop a partially written trailing line (e.g. after a crash) so records
+    appended on resume start on a fresh line and the file stays valid JSONL.
+    """
+    if not os.path.exists(output_path):
+        return
+
+    with open(output_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        pos = size
+        # Scan backwards in blocks for the last newline
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            idx = block.rfind(b"\n")
+            if idx != -1:
+                pos = pos - step + idx + 1
+                break
+            pos -= step
+        if pos < size:
+            print(f"⚠️ Dropping {size - pos} bytes of a partial record at the end of {output_path}")
+            f.truncate(pos)
+
+
+# query_openrouter_llm reports timeouts and API errors as "⚠️ ..." / "❌ ..." strings
+ERROR_PREFIXES = ("⚠️", "❌")
+
+
+# ============================================================
+# 🔹 Run a single task
+# ============================================================
+def run_batch_task(task: dict, context_text: str) -> dict:
+    start = time.perf_counter()
+    try:
+        result = invoke_agent(task["user_task"], context_text=context_text)
+        response = result.get("response", "").strip()
+        record = {
+            "id": task["id"],
+            "user_task": task["user_task"],
+            "intent": result.get("intent", "chat"),
+            "response": response,
+            "error": None,
+        }
+        if not response:
+            record["error"] = "Empty response"
+        elif response.startswith(ERROR_PREFIXES):
+            record["error"] = response
+    except Exception as e:
+        record = {
+            "id": task["id"],
+            "user_task": task["user_task"],
+            "intent": None,
+            "response": "",
+            "error": str(e),
+        }
+    record["latency_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+# ============================================================
+# 🔹 Run a whole batch
+# ============================================================
+def run_batch(input_path: str,
+              output_path: str,
+              concurrency: int = 4,
+              retrieval_batch_size: int = 64,
+              k: int = 8,
+              resume: bool = True,
+              progress: dict = None) -> dict:
+    """
+    Run every task in input_path through the LangGraph agent and stream results
+    to output_path as JSONL (one line per task, flushed as soon as it finishes).
+
+    - Retrieval is done up front per chunk of `retrieval_batch_size` tasks, with
+      one batched embedding call per chunk.
+    - At most `concurrency` agent invocations run at the same time.
+    - With `resume=True`, ids already present in output_path are skipped.
+
+    `progress` is an optional dict updated in place (used by the /batch endpoint).
+    Returns a throughput summary.
+    """
+    tasks = load_batch_tasks(input_path)
+    completed_ids = load_completed_ids(output_path) if resume else set()
+    pending_tasks = [t for t in tasks if t["id"] not in completed_ids]
+
+    summary = {
+        "total": len(tasks),
+        "skipped": len(tasks) - len(pending_tasks),
+        "completed": 0,
+        "failed": 0,
+    }
+    if progress is not None:
+        progress.update(summary)
+
+    print(f"📦 Batch: {len(pending_tasks)} tasks to run ({summary['skipped']} already done).")
+
+    out_dir = os.path.dirname(output_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    if resume:
+        truncate_partial_line(output_path)
+
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out_file, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        def collect(done_futures):
+            for future in done_futures:
+                record = future.result()
+                with write_lock:
+                    out_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out_file.flush()
+                summary["failed" if record["error"] else "completed"] += 1
+                if progress is not None:
+                    progress.update(summary)
+
+        in_flight = set()
+        for i in range(0, len(pending_tasks), retrieval_batch_size):
+            chunk = pending_tasks[i:i + retrieval_batch_size]
+            contexts = retrieve_contexts_batch([t["user_task"] for t in chunk], chroma_collection, k=k)
+
+            for task, context_text in zip(chunk, contexts):
+                # Keep the queue short so results stream out while we keep retrieving
+                while len(in_flight) >= concurrency * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(run_batch_task, task, context_text))
+
+        done, _ = wait(in_flight)
+        collect(done)
+
+    elapsed = time.perf_counter() - start
+    processed = summary["completed"] + summary["failed"]
+    summary["elapsed_s"] = round(elapsed, 2)
+    summary["tasks_per_s"] = round(processed / elapsed, 3) if elapsed > 0 else 0.0
+    if progress is not None:
+        progress.update(summary)
+
+    print(f"✅ Batch finished: {summary['completed']} ok, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped in {summary['elapsed_s']}s "
+          f"({summary['tasks_per_s']} tasks/s).")
+    return summary
+
+
+# ============================================================
+# 🚀 CLI
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL/CSV batch of tasks through the CodeHelp agent.")
+    parser.add_argument("input_path", help="Input .jsonl or .csv with a 'user_task' (or 'prompt') column")
+    parser.add_argument("output_path", help="Output .jsonl file (appended to when resuming)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max concurrent agent runs")
+    parser.add_argument("--retrieval-batch-size", type=int, default=64, help="Tasks embedded per retrieval batch")
+    parser.add_argument("--k", type=int, default=8, help="Examples retrieved per task")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite output instead of resuming")
+    args = parser.parse_args()
+
+    run_batch(
+        args.input_path,
+        args.output_path,
+        concurrency=args.concurrency,
+        retrieval_batch_size=args.retrieval_batch_size,
+        k=args.k,
+        resume=not args.no_resume,
+    )
+
+
+if __name__ == "__main__":
+    main()
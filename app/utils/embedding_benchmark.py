@@ -0,0 +1,158 @@
+# ============================================================
+# ⏱️ Embedding Benchmark — torch vs ONNX vs int8 ONNX on CPU
+# ============================================================
+# Usage:
+#   python -m app.utils.embedding_benchmark --docs 2000 --queries 200
+#
+# Each backend runs in its own subprocess so peak RSS is measured cleanly.
+# Retrieval agreement is top-k overlap against the torch backend over the
+# same documents and held-out queries (brute-force cosine search).
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+
+from config.constants import COMBINED_RAG_CORPUS
+from app.retrieval.embedding_backends import EMBEDDING_BACKENDS
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def load_texts(n_docs: int, n_queries: int, seed: int = 42):
+    if not os.path.exists(COMBINED_RAG_CORPUS):
+        raise FileNotFoundError(
+            f"❌ {COMBINED_RAG_CORPUS} not found. Build it first with app/retrieval/knowledge_base.py."
+        )
+    prompts = pd.read_csv(COMBINED_RAG_CORPUS)["prompt"].astype(str).tolist()
+    random.Random(seed).shuffle(prompts)
+    if len(prompts) < n_docs + n_queries:
+        raise ValueError(f"❌ Corpus has {len(prompts)} prompts, need --docs + --queries = {n_docs + n_queries}.")
+    docs = prompts[:n_docs]
+    # Held-out prompts: a query that is itself an indexed document would be
+    # its own top hit under every backend and inflate agreement
+    queries = [p[:300] for p in prompts[n_docs:n_docs + n_queries]]
+    return docs, queries
+
+
+# ============================================================
+# 🔹 Worker: benchmark one backend (runs in a subprocess)
+# ============================================================
+def run_worker(backend: str, n_docs: int, n_queries: int, out_path: str):
+    from app.retrieval.embedding_backends import SentenceTransformerBackendEmbeddings
+
+    docs, queries = load_texts(n_docs, n_queries)
+
+    start = time.perf_counter()
+    embeddings = SentenceTransformerBackendEmbeddings(MODEL_NAME, backend=backend)
+    load_s = time.perf_counter() - start
+
+    # Warm-up so lazy initialization is not counted
+    embeddings.embed_documents(docs[:8])
+
+    start = time.perf_counter()
+    doc_vectors = np.array(embeddings.embed_documents(docs), dtype=np.float32)
+    encode_s = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(query))
+        latencies.append(time.perf_counter() - start)
+
+    np.savez(out_path, docs=doc_vectors, queries=np.array(query_vectors, dtype=np.float32))
+
+    # ru_maxrss is in KiB on Linux
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "docs_per_s": round(len(docs) / encode_s, 1),
+        "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "query_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+        "peak_rss_mb": round(rss_mb, 1),
+    }))
+
+
+# ============================================================
+# 🔹 Agreement with the torch index
+# ============================================================
+def top_k(doc_vectors, query_vectors, k):
+    doc_vectors = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def agreement(reference, candidate, k):
+    ref_top = top_k(reference["docs"], reference["queries"], k)
+    cand_top = top_k(candidate["docs"], candidate["queries"], k)
+    overlap = np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)])
+    top1 = np.mean(ref_top[:, 0] == cand_top[:, 0])
+
+    ref_docs = reference["docs"] / np.linalg.norm(reference["docs"], axis=1, keepdims=True)
+    cand_docs = candidate["docs"] / np.linalg.norm(candidate["docs"], axis=1, keepdims=True)
+    cosine = np.min(np.sum(ref_docs * cand_docs, axis=1))
+    return round(float(overlap), 4), round(float(top1), 4), round(float(cosine), 4)
+
+
+# ============================================================
+# 🚀 CLI
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU embedding backends for all-MiniLM-L6-v2.")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--docs", type=int, default=2000, help="Documents to encode")
+    parser.add_argument("--queries", type=int, default=200, help="Single-query latency samples")
+    parser.add_argument("--k", type=int, default=8, help="Top-k for retrieval agreement")
+    parser.add_argument("--worker", choices=EMBEDDING_BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.docs, args.queries, args.out)
+        return
+
+    backends = list(args.backends)
+    if "torch" not in backends:
+        backends.insert(0, "torch")  # reference for agreement
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vectors = {}
+        for backend in backends:
+            print(f"⏱️ Benchmarking {backend}...")
+            out_path = os.path.join(tmp_dir, f"{backend}.npz")
+            proc = subprocess.run(
+                [sys.executable, "-m", "app.utils.embedding_benchmark", "--worker", backend,
+                 "--docs", str(args.docs), "--queries", str(args.queries), "--out", out_path],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"⚠️ {backend} failed:\n{proc.stderr.strip()[-1000:]}")
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            vectors[backend] = np.load(out_path)
+
+        for row in results:
+            if "torch" in vectors and row["backend"] in vectors:
+                overlap, top1, cosine = agreement(vectors["torch"], vectors[row["backend"]], args.k)
+                row[f"top{args.k}_overlap"] = overlap
+                row["top1_agreement"] = top1
+                row["min_doc_cosine"] = cosine
+
+    df = pd.DataFrame(results)
+    print("\n📊 Embedding backend benchmark")
+    print(df.to_string(index=False))
+    return df
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,13 @@ from app.llm.router import llm_router
 from app.llm.interface import query_openrouter_llm
 from app.retrieval.retriever import retrieve_context_from_chroma
 from app.prompts.prompts import get_generation_prompt, get_explanation_prompt
-from app.retrieval.embeddings import reload_chroma_vectorstore
+from app.retrieval.embeddings import reload_chroma_vectorstore, prepare_chroma_indexes
 from app.llm.router import intent_router
+from app.utils.single_flight import SingleFlight
+from app.utils.profiler import profiled_thread
 
+# Re-embed stale indexes once here, at startup, rather than on a request
+prepare_chroma_indexes()
 chroma_collection = reload_chroma_vectorstore()
 
 # 🧩 1. Define state structure
@@ -13,27 +17,38 @@ class AgentState(dict):
     user_task: str = ""
     intent: str = ""
     response: str = ""
+    context_text: str = None  # filled by the retrieve node (or pre-computed by batch runs)
 
 
 # 🧠 2. Define the node functions
+def get_context(state: AgentState):
+    """Use the context retrieved alongside routing, otherwise query Chroma."""
+    context_text = state.get("context_text")
+    if context_text is None:
+        context_text = retrieve_context_from_chroma(state["user_task"], chroma_collection, k=8)
+    return context_text
+
+@profiled_thread
 def node_generate(state: AgentState):
     user_task = state["user_task"]
-    context_text = retrieve_context_from_chroma(user_task, chroma_collection, k=8)
+    context_text = get_context(state)
     final_prompt = get_generation_prompt(user_task, context_text, "")
     response = query_openrouter_llm(final_prompt)
     state["response"] = response
     print("🧠 Generated code:\n", response)
     return state
 
+@profiled_thread
 def node_explain(state: AgentState):
     user_task = state["user_task"]
-    context_text = retrieve_context_from_chroma(user_task, chroma_collection, k=8)
+    context_text = get_context(state)
     final_prompt = get_explanation_prompt(user_task, context_text)
     response = query_openrouter_llm(final_prompt)
     state["response"] = response
     print("📘 Explanation:\n", response)
     return state
 
+@profiled_thread
 def node_chat(state: AgentState):
     user_task = state["user_task"]
     response = query_openrouter_llm(user_task)
@@ -41,23 +56,35 @@ def node_chat(state: AgentState):
     print("💬 Chat reply:\n", response)
     return state
 
-# 🧭 3. Define router
+# 🧭 3. Define router + speculative retrieval
+# Both run in parallel in the first step, so they only return the keys they set.
+@profiled_thread
 def router_node(state: AgentState):
     user_task = state["user_task"]
     intent = intent_router(user_task, llm_router)
-    state["intent"] = intent
     print(f"⚙️ Intent detected → {intent.upper()}")
-    return state
+    return {"intent": intent}
+
+@profiled_thread
+def node_retrieve(state: AgentState):
+    # Started before the intent is known: generate/explain use the result,
+    # chat simply ignores it.
+    if state.get("context_text") is not None:
+        return {}
+    context_text = retrieve_context_from_chroma(state["user_task"], chroma_collection, k=8)
+    return {"context_text": context_text}
 
 # 🕸️ 4. Build LangGraph
 graph = StateGraph(AgentState)
 
 graph.add_node("router", router_node)
+graph.add_node("retrieve", node_retrieve)
 graph.add_node("generate", node_generate)
 graph.add_node("explain", node_explain)
 graph.add_node("chat", node_chat)
 
 graph.add_edge(START, "router")
+graph.add_edge(START, "retrieve")
 graph.add_conditional_edges(
     "router",
     lambda state: state["intent"],
@@ -67,11 +94,38 @@ graph.add_conditional_edges(
         "chat": "chat"
     }
 )
+graph.add_edge("retrieve", END)
 graph.add_edge("generate", END)
 graph.add_edge("explain", END)
 graph.add_edge("chat", END)
 
 langgraph_agent = graph.compile()
+run_agent = profiled_thread(langgraph_agent.invoke)
+
+# 🛬 Identical requests in flight at the same time share one agent run
+agent_flight = SingleFlight()
+
+def flight_key(user_task: str):
+    """
+    Normalize case and whitespace so trivially different inputs coalesce.
+    Only the task is keyed: the intent is decided by the router inside the run.
+    """
+    return " ".join(user_task.lower().split())
+
+def invoke_agent(user_task: str, **extra_state):
+    """
+    Sync agent run, coalesced with identical in-flight requests.
+    `coalesced` in the result is True when another caller's run was shared.
+    """
+    state = AgentState({"user_task": user_task, **extra_state})
+    result, shared = agent_flight.do(flight_key(user_task), run_agent, state)
+    return {**result, "coalesced": shared}
+
+async def ainvoke_agent(user_task: str, **extra_state):
+    """Async agent run (in a worker thread), coalesced with identical in-flight requests."""
+    state = AgentState({"user_task": user_task, **extra_state})
+    result, shared = await agent_flight.do_async(flight_key(user_task), run_agent, state)
+    return {**result, "coalesced": shared}
 
 # 🚀 5. Define a simple runner
 def run_langgraph_agent():
@@ -0,0 +1,196 @@
+# ============================================================
+# 🔥 Sampling Profiler — opt-in, per chat request
+# ============================================================
+import os
+import re
+import sys
+import time
+import random
+import threading
+import functools
+import contextvars
+from collections import Counter
+from datetime import datetime
+
+from config.constants import PROFILES_DIR
+from config.settings import PROFILE_SAMPLE_RATE, PROFILE_INTERVAL, PROFILE_MAX_FILES
+
+# Leaf frames of threads that are just idling (executor workers waiting for
+# work, the event loop waiting in select); they would only add noise.
+IDLE_LEAVES = {
+    ("_worker", "concurrent/futures/thread.py"),
+    ("wait", "threading.py"),
+    ("select", "selectors.py"),
+}
+
+PROFILE_NAME_RE = re.compile(r"^(?P<timestamp>\d{8}_\d{6})_(?P<request_id>[\w-]+)_(?P<intent>\w+)\.folded$")
+
+
+def should_profile(request) -> bool:
+    """Profile when asked via header/query flag, or for a random sample of requests."""
+    if request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1":
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    """Trim site-packages/stdlib prefixes so torch, chromadb, langchain... stand out."""
+    filename = filename.replace("\\", "/")
+    for marker in ("site-packages/", "dist-packages/", "/lib/python3"):
+        idx = filename.rfind(marker)
+        if idx != -1:
+            tail = filename[idx + len(marker):]
+            return tail.split("/", 1)[1] if marker == "/lib/python3" and "/" in tail else tail
+    return os.path.relpath(filename) if os.path.isabs(filename) else filename
+
+
+@functools.lru_cache(maxsize=16384)
+def _frame_label(code) -> str:
+    # Cached per code object: path trimming is too slow to redo for every frame
+    return f"{code.co_name} ({_short_path(code.co_filename)})".replace(";", ":")
+
+
+# Profiler of the request running in the current context (None when not profiled)
+_active_profiler = contextvars.ContextVar("codehelp_active_profiler", default=None)
+
+
+def profiled_thread(fn):
+    """
+    Mark `fn` as doing work for the current request: while it runs, its thread
+    is sampled by the request's profiler, if any. The profiler is found via
+    contextvars, so the thread must be started with the caller's context
+    (asyncio.to_thread, LangGraph nodes, or copy_context().run on submit).
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiler = _active_profiler.get()
+        if profiler is None:
+            return fn(*args, **kwargs)
+        thread_id = threading.get_ident()
+        profiler.add_thread(thread_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.remove_thread(thread_id)
+    return wrapper
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of the request's threads every `interval`
+    seconds while running, and writes them in the folded format used by
+    flamegraph.pl, speedscope and inferno ("frame;frame;frame count" per line).
+
+    Sampled threads are the one that called start() (the event loop) and any
+    thread currently inside a profiled_thread function started from the
+    request's context: the agent run, LangGraph nodes, LLM calls and
+    persistence. Limits: the event loop is shared, so other requests'
+    coroutines may show up there; a request coalesced onto another one's
+    agent run only shows the wait; threads created without the request's
+    context are not sampled.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._threads = Counter()
+        self._threads_lock = threading.Lock()
+        self._token = None
+        self._owner = None
+        self.started_at = None
+        self.duration = 0.0
+
+    def add_thread(self, thread_id: int):
+        with self._threads_lock:
+            self._threads[thread_id] += 1
+
+    def remove_thread(self, thread_id: int):
+        with self._threads_lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._owner = threading.get_ident()
+        self.add_thread(self._owner)
+        self._token = _active_profiler.set(self)
+        self._thread = threading.Thread(target=self._run, name="codehelp-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._token is not None:
+            _active_profiler.reset(self._token)
+            self._token = None
+            self.remove_thread(self._owner)
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._threads_lock:
+                thread_ids = list(self._threads)
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+
+                leaf = (frame.f_code.co_name, _short_path(frame.f_code.co_filename))
+                if any(leaf[0] == name and leaf[1].endswith(path) for name, path in IDLE_LEAVES):
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)).replace(";", ":"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def save(self, request_id: str, intent: str, profiles_dir: str = PROFILES_DIR) -> str:
+        """Write the folded stacks and return the profile file name."""
+        os.makedirs(profiles_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        name = f"{timestamp}_{request_id}_{intent}.folded"
+        with open(os.path.join(profiles_dir, name), "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"🔥 Saved profile ({sum(self.samples.values())} samples, {self.duration:.2f}s) → {name}")
+        prune_profiles(profiles_dir)
+        return name
+
+
+def prune_profiles(profiles_dir: str = PROFILES_DIR, keep: int = PROFILE_MAX_FILES):
+    """Delete all but the newest `keep` profiles, so opt-in profiling cannot fill the disk."""
+    names = sorted((n for n in os.listdir(profiles_dir) if PROFILE_NAME_RE.match(n)), reverse=True)
+    for name in names[keep:]:
+        try:
+            os.remove(os.path.join(profiles_dir, name))
+        except OSError as e:
+            print(f"⚠️ Could not delete old profile {name}: {e}")
+
+
+def list_profiles(profiles_dir: str = PROFILES_DIR) -> list:
+    """Saved profiles, newest first."""
+    profiles = []
+    if not os.path.isdir(profiles_dir):
+        return profiles
+
+    for name in sorted(os.listdir(profiles_dir), reverse=True):
+        match = PROFILE_NAME_RE.match(name)
+        if not match:
+            continue
+        profiles.append({
+            "name": name,
+            "request_id": match.group("request_id"),
+            "intent": match.group("intent"),
+            "created": match.group("timestamp"),
+            "size_bytes": os.path.getsize(os.path.join(profiles_dir, name)),
+        })
+    return profiles
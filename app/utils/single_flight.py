@@ -0,0 +1,79 @@
+# ============================================================
+# 🛬 Single-flight — share one execution between identical calls
+# ============================================================
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers arriving
+    while it is still in flight wait for the same result, or the same exception.
+    The key is released as soon as the call finishes, so later calls run fresh.
+
+    `do` is for sync callers, `do_async` for coroutines; both share the same
+    in-flight table, so a sync and an async caller can coalesce with each other.
+    Both return (result, shared), where `shared` is True for followers that got
+    the leader's result instead of running `fn` themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"executions": 0, "coalesced": 0, "errors": 0}
+
+    def _claim(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["executions"] += 1
+            return future, True
+
+    def _run(self, key, future, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+                self._stats["errors"] += 1
+            future.set_exception(e)
+        else:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        future, leader = self._claim(key)
+        if leader:
+            self._run(key, future, fn, args, kwargs)
+        return future.result(), not leader
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        Run blocking `fn` in the default executor, coalesced by key.
+        Cancelling one waiter never cancels the shared execution: the others
+        still get the result, and the leader's work finishes in the background.
+        The leader's contextvars are carried into the worker thread.
+        """
+        future, leader = self._claim(key)
+        if leader:
+            loop = asyncio.get_running_loop()
+            run = functools.partial(contextvars.copy_context().run, self._run, key, future, fn, args, kwargs)
+            loop.run_in_executor(None, run)
+        result = await asyncio.shield(asyncio.wrap_future(future))
+        return result, not leader
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
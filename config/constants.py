@@ -8,13 +8,16 @@ LOGS_DIR = "logs"
 GEN_DIR = os.path.join(LOGS_DIR, "generation")
 EXP_DIR = os.path.join(LOGS_DIR, "explanation")
 CHAT_DIR = os.path.join(LOGS_DIR, "chat")
+PROFILES_DIR = os.path.join(LOGS_DIR, "profiles")
+BATCH_DIR = os.path.join(LOGS_DIR, "batch")
 
 # Ensure folders exist
-for folder in [GEN_DIR, EXP_DIR, CHAT_DIR]:
+for folder in [GEN_DIR, EXP_DIR, CHAT_DIR, PROFILES_DIR, BATCH_DIR]:
     os.makedirs(folder, exist_ok=True)
 
 KNOWLEDGE_BASE_DIR = "data/knowledge_base"
 COMBINED_RAG_CORPUS = f"{KNOWLEDGE_BASE_DIR}/combined_rag_corpus.csv"
 GROUND_TRUTH_JSON = f"{KNOWLEDGE_BASE_DIR}/ground_truth_ids_for_task.json"
+NEAR_DUPLICATES_JSON = f"{KNOWLEDGE_BASE_DIR}/near_duplicate_clusters.json"
 CHROMA_EMBEDDINGS_DIR = "data/chroma/chroma_embeddings"
 CHROMA_MEMORY_DIR = "data/chroma/chroma_memory"
\ No newline at end of file
@@ -1,5 +1,86 @@
 # config/settings.py
 import os
+import json
+import secrets
 
 # Read OpenRouter API key from environment variable or fallback to None
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", None)
+
+# ============================================================
+# 🔀 LLM model policy
+# ============================================================
+# Ordered list of OpenRouter models to try for each intent ("router" is the
+# intent classifier itself). The first model is the primary; the rest are
+# fallbacks / hedge targets. Override with a JSON object in CODEHELP_MODEL_POLICY.
+DEFAULT_MODEL_POLICY = {
+    "router": ["deepseek/deepseek-r1", "meta-llama/llama-3.1-8b-instruct"],
+    "generate": ["deepseek/deepseek-r1", "qwen/qwen-2.5-coder-32b-instruct"],
+    "explain": ["deepseek/deepseek-r1", "meta-llama/llama-3.1-70b-instruct"],
+    "chat": ["deepseek/deepseek-r1", "meta-llama/llama-3.1-70b-instruct"],
+}
+MODEL_POLICY = json.loads(os.getenv("CODEHELP_MODEL_POLICY", "null")) or DEFAULT_MODEL_POLICY
+
+# Request timeout (seconds) per intent
+MODEL_TIMEOUTS = {"router": 20, "generate": 60, "explain": 60, "chat": 60}
+MODEL_CONNECT_TIMEOUT = float(os.getenv("CODEHELP_MODEL_CONNECT_TIMEOUT", "5"))
+
+# Hedged requests: once the primary is slower than this latency percentile
+# (of its recent successful calls), fire the next model and keep the first
+# good answer. Until enough samples exist, HEDGE_DEFAULT_DELAY is used.
+HEDGE_ENABLED = os.getenv("CODEHELP_HEDGE", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("CODEHELP_HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("CODEHELP_HEDGE_DEFAULT_DELAY", "15"))
+HEDGE_MIN_DELAY = 2.0
+HEDGE_MIN_SAMPLES = 10
+HEDGE_MAX_OUTSTANDING = int(os.getenv("CODEHELP_HEDGE_MAX_OUTSTANDING", "8"))
+
+# ============================================================
+# 🧮 Embedding backend
+# ============================================================
+# "torch"     → PyTorch SentenceTransformer (original behaviour)
+# "onnx"      → ONNX Runtime, fp32 (same vectors as torch up to float noise)
+# "onnx-int8" → ONNX Runtime, int8 dynamically quantized weights
+EMBEDDING_BACKEND = os.getenv("CODEHELP_EMBEDDING_BACKEND", "torch")
+# Optional override of the ONNX file inside the model repo (e.g. "onnx/model_qint8_avx512.onnx")
+EMBEDDING_ONNX_FILE = os.getenv("CODEHELP_EMBEDDING_ONNX_FILE")
+# Minimum cosine similarity between probe vectors of the index's backend and the
+# current backend for the existing index to be reused without re-embedding
+EMBEDDING_COMPAT_THRESHOLD = 0.99
+
+# ============================================================
+# 🔥 Request profiling
+# ============================================================
+# Fraction of chat requests profiled automatically (0 = only on demand via
+# the "X-Profile: 1" header or "?profile=1" query flag)
+PROFILE_SAMPLE_RATE = float(os.getenv("CODEHELP_PROFILE_SAMPLE_RATE", "0"))
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("CODEHELP_PROFILE_INTERVAL", "0.01"))
+# Newest profiles kept in logs/profiles; older ones are deleted on save
+PROFILE_MAX_FILES = int(os.getenv("CODEHELP_PROFILE_MAX_FILES", "200"))
+
+# ============================================================
+# 🧬 Corpus near-duplicate filtering
+# ============================================================
+NEAR_DEDUP_ENABLED = os.getenv("CODEHELP_NEAR_DEDUP", "1") == "1"
+# Estimated Jaccard similarity (over code-token shingles) above which a document is dropped
+NEAR_DEDUP_THRESHOLD = float(os.getenv("CODEHELP_NEAR_DEDUP_THRESHOLD", "0.85"))
+NEAR_DEDUP_NUM_PERM = int(os.getenv("CODEHELP_NEAR_DEDUP_NUM_PERM", "128"))
+NEAR_DEDUP_SHINGLE_SIZE = int(os.getenv("CODEHELP_NEAR_DEDUP_SHINGLE_SIZE", "5"))
+
+# ============================================================
+# 🚦 /chat admission control
+# ============================================================
+CHAT_MAX_CONCURRENT = int(os.getenv("CODEHELP_CHAT_MAX_CONCURRENT", "8"))
+CHAT_MAX_QUEUE = int(os.getenv("CODEHELP_CHAT_MAX_QUEUE", "16"))
+# Longest a request may wait for a slot before getting a 503
+CHAT_MAX_QUEUE_WAIT_S = float(os.getenv("CODEHELP_CHAT_MAX_QUEUE_WAIT_S", "10"))
+# Per-session token bucket (0 disables rate limiting)
+SESSION_RATE_LIMIT_PER_MIN = float(os.getenv("CODEHELP_SESSION_RATE_LIMIT_PER_MIN", "10"))
+SESSION_RATE_LIMIT_BURST = int(os.getenv("CODEHELP_SESSION_RATE_LIMIT_BURST", "3"))
+# Per-client-IP token bucket on top of the session one, since fresh session
+# cookies cost nothing. Looser, as several users may share an IP behind a NAT.
+IP_RATE_LIMIT_PER_MIN = float(os.getenv("CODEHELP_IP_RATE_LIMIT_PER_MIN", "60"))
+IP_RATE_LIMIT_BURST = int(os.getenv("CODEHELP_IP_RATE_LIMIT_BURST", "10"))
+# Key signing the session cookie issued on GET /. Random per process when
+# unset, so sessions (and their rate-limit buckets) reset on restart.
+SESSION_SECRET = os.getenv("CODEHELP_SESSION_SECRET") or secrets.token_hex(32)
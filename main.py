@@ -1,17 +1,42 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Form, BackgroundTasks, UploadFile, File
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from datetime import datetime
 from langchain.schema import Document
+from pydantic import BaseModel
 import os
+import re
+import uuid
+import asyncio
 import time
 import logging
 
 # === Imports from your app ===
-from app.utils.langgraph_setup import langgraph_agent
+from app.utils.langgraph_setup import ainvoke_agent, agent_flight
 from app.memory.session_memory import session_memory
 from app.memory.chroma_memory import init_chroma_memory, reload_chroma_vectorstore
+from app.utils.batch_runner import run_batch
+from app.llm.model_policy import model_stats
+from app.utils.profiler import SamplingProfiler, should_profile, list_profiles, profiled_thread
+from app.utils.admission import (
+    AdmissionController,
+    SessionRateLimiter,
+    AdmissionRejected,
+    issue_session_cookie,
+    verify_session_cookie,
+)
+from config.constants import PROFILES_DIR, BATCH_DIR
+from config.settings import (
+    CHAT_MAX_CONCURRENT,
+    CHAT_MAX_QUEUE,
+    CHAT_MAX_QUEUE_WAIT_S,
+    SESSION_RATE_LIMIT_PER_MIN,
+    SESSION_RATE_LIMIT_BURST,
+    IP_RATE_LIMIT_PER_MIN,
+    IP_RATE_LIMIT_BURST,
+    SESSION_SECRET,
+)
 
 # ==========================================================
 # ⚙️ Setup FastAPI App
@@ -28,6 +53,18 @@ user_api_key_store = {}
 # Keep last 8 chat messages for UI
 chat_history = []
 
+# Batch jobs started via /batch (job_id -> progress/summary)
+batch_jobs = {}
+
+# Bounded concurrency + short queue + per-session and per-IP rate limits for chat requests
+chat_admission = AdmissionController(
+    max_concurrent=CHAT_MAX_CONCURRENT,
+    max_queue=CHAT_MAX_QUEUE,
+    max_wait_s=CHAT_MAX_QUEUE_WAIT_S,
+    rate_limiter=SessionRateLimiter(SESSION_RATE_LIMIT_PER_MIN, SESSION_RATE_LIMIT_BURST),
+    ip_rate_limiter=SessionRateLimiter(IP_RATE_LIMIT_PER_MIN, IP_RATE_LIMIT_BURST, label="IP address")
+)
+
 # ==========================================================
 # 📁 Logging Setup
 # ==========================================================
@@ -46,10 +83,14 @@ os.makedirs(CHAT_DIR, exist_ok=True)
 # ==========================================================
 @app.get("/", response_class=HTMLResponse)
 async def get_home(request: Request):
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "index.html",
         {"request": request, "chat_history": chat_history, "api_key_set": "key" in user_api_key_store}
     )
+    # Issue a signed session cookie; chat rate limits are keyed on it
+    if verify_session_cookie(request.cookies.get("session_id"), SESSION_SECRET) is None:
+        response.set_cookie("session_id", issue_session_cookie(SESSION_SECRET), httponly=True, samesite="lax")
+    return response
 
 # ==========================================================
 # 🔑 Save API Key
@@ -63,54 +104,13 @@ async def set_api_key(api_key: str = Form(...)):
 # ==========================================================
 # 💬 Chat Endpoint
 # ==========================================================
-@app.post("/chat", response_class=HTMLResponse)
-async def post_chat(request: Request, user_input: str = Form(...)):
-    global chat_history
-
-    if "key" not in user_api_key_store:
-        return HTMLResponse("❌ Please set your API key first!")
-
-    user_task = user_input.strip()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    # ✅ Trim memory (keep short context to avoid repeated responses)
-    try:
-        if len(session_memory.chat_memory.messages) > 4:
-            session_memory.chat_memory.messages = session_memory.chat_memory.messages[-4:]
-    except Exception as e:
-        print(f"⚠️ Could not trim session memory: {e}")
-
-    # Small polite delay
-    for _ in range(3):
-        time.sleep(0.2)
-
-    # ======================================================
-    # 🔮 Run LangGraph agent
-    # ======================================================
-    try:
-        result = langgraph_agent.invoke({"user_task": user_task})
-        response = result.get("response", "").strip()
-        intent = result.get("intent", "chat")
-
-        if not response:
-            print("⚠️ Empty response returned from LangGraph agent:", result)
-            response = "⚠️ The model returned an empty response."
-
-        # 🧹 Remove possible duplication if model repeats last answer
-        if len(chat_history) > 0 and chat_history[-1]["bot"].strip() == response.strip():
-            print("⚠️ Detected repeated response; ignoring duplicate context.")
-            response = "⚠️ Please rephrase or ask a different question."
-    except Exception as e:
-        response = f"❌ LangGraph execution failed: {e}"
-        intent = "chat"
-
+@profiled_thread
+def persist_exchange(user_task: str, response: str, intent: str, timestamp: str):
+    """Save one exchange to Chroma memory, the Chroma corpus and the logs (blocking)."""
     # ======================================================
     # 🧠 Save Context to Memory + Chroma
     # ======================================================
     try:
-        session_memory.chat_memory.add_user_message(user_task)
-        session_memory.chat_memory.add_ai_message(response)
-
         memory, memory_vectorstore = init_chroma_memory()
         memory.save_context({"input": user_task}, {"output": response})
     except Exception as e:
@@ -144,17 +144,262 @@ async def post_chat(request: Request, user_input: str = Form(...)):
     except Exception as e:
         print(f"⚠️ Failed to write log file: {e}")
 
+async def run_chat_exchange(user_task: str) -> dict:
+    """
+    Run one chat exchange (agent, memory, Chroma, logs, history) and return the
+    new exchange with its timings. Shared by the form route and the JSON API.
+    """
+    global chat_history
+
+    start = time.perf_counter()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # ✅ Trim memory (keep short context to avoid repeated responses)
+    try:
+        if len(session_memory.chat_memory.messages) > 4:
+            session_memory.chat_memory.messages = session_memory.chat_memory.messages[-4:]
+    except Exception as e:
+        print(f"⚠️ Could not trim session memory: {e}")
+
+    # Small polite delay (non-blocking, so other requests keep being served)
+    await asyncio.sleep(0.6)
+
+    # ======================================================
+    # 🔮 Run LangGraph agent
+    # ======================================================
+    agent_start = time.perf_counter()
+    try:
+        result = await ainvoke_agent(user_task)
+        response = result.get("response", "").strip()
+        intent = result.get("intent", "chat")
+
+        if not response:
+            print("⚠️ Empty response returned from LangGraph agent:", result)
+            response = "⚠️ The model returned an empty response."
+
+        # 🧹 Remove possible duplication if model repeats last answer
+        # (a coalesced run legitimately returns the answer another request just got)
+        if (not result.get("coalesced") and len(chat_history) > 0
+                and chat_history[-1]["bot"].strip() == response.strip()):
+            print("⚠️ Detected repeated response; ignoring duplicate context.")
+            response = "⚠️ Please rephrase or ask a different question."
+    except Exception as e:
+        response = f"❌ LangGraph execution failed: {e}"
+        intent = "chat"
+
+    agent_s = time.perf_counter() - agent_start
+
+    # Session memory stays on the event loop (it is trimmed there). Chroma and
+    # log writes block on embedding, sqlite and disk, so they run in a worker
+    # thread instead of stalling every other request.
+    persist_start = time.perf_counter()
+    try:
+        session_memory.chat_memory.add_user_message(user_task)
+        session_memory.chat_memory.add_ai_message(response)
+    except Exception as e:
+        print(f"⚠️ Session memory update failed: {e}")
+    await asyncio.to_thread(persist_exchange, user_task, response, intent, timestamp)
+    persist_s = time.perf_counter() - persist_start
+
     # ======================================================
     # 🧾 Update Chat History for Frontend
     # ======================================================
     chat_history.append({"user": user_task, "bot": response})
     chat_history = chat_history[-8:]  # keep last 8 messages
 
+    return {
+        "user": user_task,
+        "bot": response,
+        "intent": intent,
+        "timings": {
+            "agent_s": round(agent_s, 3),
+            "persist_s": round(persist_s, 3),
+            "total_s": round(time.perf_counter() - start, 3),
+        },
+    }
+
+async def run_profiled_exchange(request: Request, user_task: str) -> dict:
+    """
+    Run the exchange, under the sampling profiler when the request opts in
+    (X-Profile header, ?profile=1, or the configured sampling rate).
+    """
+    if not should_profile(request):
+        return await run_chat_exchange(user_task)
+
+    request_id = re.sub(r"[^\w-]", "", request.headers.get("x-request-id", ""))[:64] or uuid.uuid4().hex[:12]
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        exchange = await run_chat_exchange(user_task)
+    except BaseException:
+        profiler.stop()
+        profiler.save(request_id, "error")
+        raise
+    profiler.stop()
+    exchange["request_id"] = request_id
+    exchange["profile"] = profiler.save(request_id, exchange["intent"])
+    return exchange
+
+def request_session_id(request: Request) -> str:
+    """
+    Rate-limit key: the server-signed session cookie set on GET /. Clients
+    without a valid one (API-only callers) are limited per IP address, so
+    clients behind the same NAT or proxy share one bucket.
+    """
+    session_id = verify_session_cookie(request.cookies.get("session_id"), SESSION_SECRET)
+    if session_id is not None:
+        return f"session:{session_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def request_deadline(request: Request):
+    """Client's total time budget in seconds, from the optional X-Request-Timeout header."""
+    try:
+        return float(request.headers["x-request-timeout"])
+    except (KeyError, ValueError):
+        return None
+
+async def run_admitted_exchange(request: Request, user_task: str) -> dict:
+    client_ip = request.client.host if request.client else "unknown"
+    async with chat_admission.admit(request_session_id(request), request_deadline(request), client_ip):
+        return await run_profiled_exchange(request, user_task)
+
+@app.post("/chat", response_class=HTMLResponse)
+async def post_chat(request: Request, user_input: str = Form(...)):
+    if "key" not in user_api_key_store:
+        return HTMLResponse("❌ Please set your API key first!")
+
+    try:
+        await run_admitted_exchange(request, user_input.strip())
+    except AdmissionRejected as e:
+        return HTMLResponse(f"⚠️ {e.reason} Please retry in {e.retry_after}s.",
+                            status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+
     return templates.TemplateResponse(
         "index.html",
         {"request": request, "chat_history": chat_history, "api_key_set": True}
     )
 
+# ==========================================================
+# 🧩 JSON Chat API — returns only the new exchange
+# ==========================================================
+class ChatRequest(BaseModel):
+    user_input: str
+
+@app.post("/api/chat")
+async def post_chat_api(request: Request, chat_request: ChatRequest):
+    if "key" not in user_api_key_store:
+        return JSONResponse({"error": "Please set your API key first!"}, status_code=401)
+
+    user_task = chat_request.user_input.strip()
+    if not user_task:
+        return JSONResponse({"error": "Empty message."}, status_code=400)
+
+    try:
+        return await run_admitted_exchange(request, user_task)
+    except AdmissionRejected as e:
+        return JSONResponse({"error": f"{e.reason} Please retry in {e.retry_after}s.", "retry_after": e.retry_after},
+                            status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+
+
+# ==========================================================
+# 📦 Batch Endpoint
+# ==========================================================
+BATCH_JOB_ID_RE = re.compile(r"^\d{8}_\d{6}_\d{6}$")
+BATCH_MAX_CONCURRENCY = 16
+
+def batch_job_paths(job_id: str, input_ext: str = None):
+    """Input/output files of a batch job; both live in the server-owned BATCH_DIR."""
+    if input_ext is None:
+        input_ext = ".csv" if os.path.exists(os.path.join(BATCH_DIR, f"{job_id}.input.csv")) else ".jsonl"
+    return (os.path.join(BATCH_DIR, f"{job_id}.input{input_ext}"),
+            os.path.join(BATCH_DIR, f"{job_id}.jsonl"))
+
+def _run_batch_job(job_id: str, input_path: str, output_path: str, concurrency: int):
+    job = batch_jobs[job_id]
+    try:
+        run_batch(input_path, output_path, concurrency=concurrency, progress=job)
+        job["status"] = "done"
+    except Exception as e:
+        print(f"❌ Batch job {job_id} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+
+@app.post("/batch")
+async def post_batch(background_tasks: BackgroundTasks,
+                     file: UploadFile = File(None),
+                     resume_job_id: str = Form(None),
+                     concurrency: int = Form(4)):
+    """
+    Start a batch from an uploaded .jsonl/.csv file, or resume an earlier job
+    by id. Files are stored under logs/batch/ with server-chosen names.
+    """
+    if "key" not in user_api_key_store:
+        return {"status": "error", "message": "Please set your API key first!"}
+
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+    if resume_job_id:
+        job_id = resume_job_id
+        if not BATCH_JOB_ID_RE.match(job_id):
+            return {"status": "error", "message": f"Invalid batch job id: {job_id}"}
+        if batch_jobs.get(job_id, {}).get("status") == "running":
+            return {"status": "error", "message": f"Batch job {job_id} is already running"}
+        input_path, output_path = batch_job_paths(job_id)
+        if not os.path.exists(input_path):
+            return {"status": "error", "message": f"Unknown batch job: {job_id}"}
+    elif file is not None:
+        job_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        input_ext = ".csv" if (file.filename or "").lower().endswith(".csv") else ".jsonl"
+        input_path, output_path = batch_job_paths(job_id, input_ext)
+        with open(input_path, "wb") as f:
+            f.write(await file.read())
+    else:
+        return {"status": "error", "message": "Upload a .jsonl/.csv file or give resume_job_id."}
+
+    batch_jobs[job_id] = {"status": "running"}
+    background_tasks.add_task(_run_batch_job, job_id, input_path, output_path, concurrency)
+    return {"status": "ok", "job_id": job_id}
+
+@app.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    if job_id not in batch_jobs:
+        return {"status": "error", "message": f"Unknown batch job: {job_id}"}
+    return batch_jobs[job_id]
+
+@app.get("/batch/{job_id}/results")
+async def get_batch_results(job_id: str):
+    if not BATCH_JOB_ID_RE.match(job_id):
+        return JSONResponse({"error": f"Invalid batch job id: {job_id}"}, status_code=400)
+    _, output_path = batch_job_paths(job_id)
+    if not os.path.exists(output_path):
+        return JSONResponse({"error": f"No results for batch job: {job_id}"}, status_code=404)
+    return FileResponse(output_path, media_type="application/x-ndjson", filename=f"{job_id}.jsonl")
+
+# ==========================================================
+# 📊 Metrics
+# ==========================================================
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "models": model_stats.snapshot(),
+        "single_flight": agent_flight.snapshot(),
+        "admission": chat_admission.snapshot(),
+    }
+
+# ==========================================================
+# 🔥 Profiles
+# ==========================================================
+@app.get("/profiles")
+async def get_profiles():
+    return {"profiles": list_profiles()}
+
+@app.get("/profiles/{name}")
+async def get_profile(name: str):
+    # Only serve files we listed ourselves (no path traversal)
+    if name not in {p["name"] for p in list_profiles()}:
+        return JSONResponse({"error": f"Unknown profile: {name}"}, status_code=404)
+    return FileResponse(os.path.join(PROFILES_DIR, name), media_type="text/plain", filename=name)
+
 # ==========================================================
 # 🚀 Run Locally (for development)
 # ==========================================================
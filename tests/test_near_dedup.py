@@ -0,0 +1,47 @@
+from app.retrieval.near_dedup import NearDuplicateFilter, candidate_probability, choose_bands
+
+
+def make_pair(shared: int, unique: int):
+    """Two token documents with Jaccard shared / (shared + 2 * unique) over single-token shingles."""
+    common = [f"t{i}" for i in range(shared)]
+    a = common + [f"a{i}" for i in range(unique)]
+    b = common + [f"b{i}" for i in range(unique)]
+    return " ".join(a), " ".join(b)
+
+
+def test_bands_for_default_threshold_favour_recall():
+    bands, rows = choose_bands(0.85, 128)
+    assert bands * rows == 128
+    assert (1 / bands) ** (1 / rows) < 0.85
+    assert candidate_probability(0.85, bands, rows) >= 0.99
+
+
+def test_lsh_recall_just_above_threshold():
+    # 372 / (372 + 2 * 28) ~= 0.869
+    text_a, text_b = make_pair(372, 28)
+    trials = 200
+    found = 0
+    for seed in range(trials):
+        dedup = NearDuplicateFilter(threshold=0.85, num_perm=128, shingle_size=1, seed=seed)
+        dedup.add("a", text_a)
+        found += "a" in dedup.candidates(dedup.signature(text_b))
+    assert found / trials >= 0.95
+
+
+def test_near_duplicates_are_dropped():
+    # 384 / (384 + 2 * 16) ~= 0.923
+    text_a, text_b = make_pair(384, 16)
+    trials = 200
+    dropped = 0
+    for seed in range(trials):
+        dedup = NearDuplicateFilter(threshold=0.85, num_perm=128, shingle_size=1, seed=seed)
+        dedup.add("a", text_a)
+        dropped += dedup.add("b", text_b) == "a"
+    assert dropped / trials >= 0.95
+
+
+def test_unrelated_documents_are_kept():
+    dedup = NearDuplicateFilter(threshold=0.85, num_perm=128, shingle_size=1)
+    text_a, text_b = make_pair(0, 400)
+    assert dedup.add("a", text_a) is None
+    assert dedup.add("b", text_b) is None